@@ -7,23 +7,111 @@ Simplified version for kdebug (no external dependencies).
 """
 
 import argparse
+import gzip
+import hashlib
 import json
 import os
 import sys
+import tempfile
 import urllib.request
 import urllib.error
+from typing import Optional
 
 
 PACKAGE_NAME = "kdebug"
 PYPI_URL = f"https://pypi.org/pypi/{PACKAGE_NAME}"
+REQUEST_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip",
+    "User-Agent": f"homebrew-{PACKAGE_NAME}-formula-updater",
+}
+
+
+# Disk cache is only used in GitHub Actions, where RUNNER_TEMP is private
+# to the job; a shared /tmp path could be pre-seeded by another user
+CACHE_DIR = (
+    os.path.join(os.environ["RUNNER_TEMP"], "pypi-cache")
+    if os.environ.get("RUNNER_TEMP")
+    else None
+)
+
+
+def _cache_path(url: str) -> str:
+    """Path of the on-disk cache entry for a URL."""
+    return os.path.join(CACHE_DIR, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+
+def _load_cache(url: str) -> Optional[dict]:
+    """Load a cached response (validators + data), or None if unavailable."""
+    if not CACHE_DIR:
+        return None
+    try:
+        with open(_cache_path(url)) as f:
+            entry = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(entry, dict) or "data" not in entry:
+        return None
+    return entry
+
+
+def _save_cache(url: str, response, data: dict):
+    """Store a urlopen response's validators and data; failures are ignored."""
+    entry = {
+        "etag": response.getheader("ETag"),
+        "last_modified": response.getheader("Last-Modified"),
+        "data": data,
+    }
+    if not CACHE_DIR or not (entry["etag"] or entry["last_modified"]):
+        return
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        # Write to a temp file and rename so a planted symlink is replaced,
+        # not followed, and readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, _cache_path(url))
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
 
 
 def fetch_json(url: str) -> dict:
-    """Fetch JSON from URL using stdlib only."""
+    """Fetch JSON from URL using stdlib only.
+
+    In GitHub Actions, responses are cached on disk and revalidated with
+    If-None-Match / If-Modified-Since, so an unchanged document costs a
+    304 with no body.
+    """
+    cached = _load_cache(url)
+    headers = dict(REQUEST_HEADERS)
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    request = urllib.request.Request(url, headers=headers)
     try:
-        with urllib.request.urlopen(url, timeout=30) as response:
-            return json.loads(response.read().decode())
-    except urllib.error.URLError as e:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            body = response.read()
+            encoding = (response.getheader("Content-Encoding") or "").strip().lower()
+            if encoding == "gzip":
+                body = gzip.decompress(body)
+            data = json.loads(body.decode())
+            _save_cache(url, response, data)
+            return data
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            return cached["data"]
+        print(f"Error fetching {url}: {e}", file=sys.stderr)
+        sys.exit(1)
+    except (urllib.error.URLError, OSError, EOFError) as e:
+        # Beyond URLError: read timeouts and corrupt or truncated gzip bodies
         print(f"Error fetching {url}: {e}", file=sys.stderr)
         sys.exit(1)
     except json.JSONDecodeError as e:
@@ -31,38 +119,45 @@ def fetch_json(url: str) -> dict:
         sys.exit(1)
 
 
-def get_latest_version() -> str:
-    """Get the latest version from PyPI."""
-    data = fetch_json(f"{PYPI_URL}/json")
+def get_latest_version(data: dict) -> str:
+    """Get the latest version from the top-level PyPI project document."""
     return data["info"]["version"]
 
 
-def get_version_info(version: str) -> dict:
-    """Get source distribution URL and SHA256 for a specific version."""
-    data = fetch_json(f"{PYPI_URL}/{version}/json")
+def get_version_info(data: dict, version: str) -> dict:
+    """Get source distribution URL and SHA256 for a specific version.
+
+    Looks the version up in the already-fetched project document and only
+    falls back to the per-version endpoint if it is missing from `releases`.
+    """
+    files = data.get("releases", {}).get(version)
+    if files is None:
+        files = fetch_json(f"{PYPI_URL}/{version}/json")["urls"]
 
     # Find source distribution (sdist)
-    for release in data["urls"]:
-        if release["packagetype"] == "sdist":
-            return {
-                "version": version,
-                "url": release["url"],
-                "sha256": release["digests"]["sha256"],
-            }
+    sdist = next((f for f in files if f["packagetype"] == "sdist"), None)
+    if sdist is None:
+        print(f"Error: No source distribution found for version {version}", file=sys.stderr)
+        sys.exit(1)
 
-    print(f"Error: No source distribution found for version {version}", file=sys.stderr)
-    sys.exit(1)
+    return {
+        "version": version,
+        "url": sdist["url"],
+        "sha256": sdist["digests"]["sha256"],
+    }
 
 
-def generate_formula(info: dict) -> str:
-    """Generate the Homebrew formula content."""
-    return f'''class Kdebug < Formula
+# Formula template split around the url and sha256 values, kept as plain
+# literals so Ruby's #{...} interpolation needs no escaping
+_FORMULA_HEAD = '''class Kdebug < Formula
   include Language::Python::Virtualenv
 
   desc "Universal Kubernetes Debug Container Utility"
   homepage "https://github.com/jessegoodier/kdebug"
-  url "{info['url']}"
-  sha256 "{info['sha256']}"
+  url "'''
+_FORMULA_MID = '''"
+  sha256 "'''
+_FORMULA_TAIL = '''"
   license "MIT"
 
   depends_on "python@3.13"
@@ -74,23 +169,28 @@ def generate_formula(info: dict) -> str:
   end
 
   test do
-    assert_match "kdebug", shell_output("#{{bin}}/kdebug --version")
+    assert_match "kdebug", shell_output("#{bin}/kdebug --version")
   end
 end
 '''
 
 
+def generate_formula(info: dict) -> str:
+    """Generate the Homebrew formula content."""
+    return "".join((_FORMULA_HEAD, info["url"], _FORMULA_MID, info["sha256"], _FORMULA_TAIL))
+
+
 def output_env(info: dict):
     """Output in GitHub Actions environment format."""
+    payload = "".join(f"{key}={value}\n" for key, value in info.items())
+
     github_output = os.environ.get("GITHUB_OUTPUT")
     if github_output:
         with open(github_output, "a") as f:
-            for key, value in info.items():
-                f.write(f"{key}={value}\n")
+            f.write(payload)
 
     # Also print for debugging
-    for key, value in info.items():
-        print(f"{key}={value}")
+    sys.stdout.write(payload)
 
 
 def main():
@@ -107,15 +207,17 @@ def main():
 
     args = parser.parse_args()
 
+    data = fetch_json(f"{PYPI_URL}/json")
+
     # Get version
     if args.fetch_version_from_pypi:
-        version = get_latest_version()
+        version = get_latest_version(data)
         print(f"Latest PyPI version: {version}")
     else:
         version = args.version.lstrip("v")  # Strip 'v' prefix if present
 
     # Get version info
-    info = get_version_info(version)
+    info = get_version_info(data, version)
 
     # Output info
     if args.output_format == "json":
@@ -130,7 +232,9 @@ def main():
     # Write formula if requested
     if args.output_formula:
         formula = generate_formula(info)
-        os.makedirs(os.path.dirname(args.output_formula) or ".", exist_ok=True)
+        output_dir = os.path.dirname(args.output_formula)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
         with open(args.output_formula, "w") as f:
             f.write(formula)
         print(f"Formula written to {args.output_formula}")